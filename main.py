@@ -1,15 +1,478 @@
 import sys
 import os
-import pandas as pd
-import shutil
-import tempfile
+import multiprocessing
+import time
+import threading
 import traceback
+from collections import OrderedDict
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from PySide6.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, 
                                QWidget, QLabel, QLineEdit, QPushButton, QProgressBar, 
                                QMessageBox, QFileDialog, QGroupBox, QSpinBox, QTextEdit, 
                                QRadioButton, QCheckBox)
 from PySide6.QtCore import Qt, QThread, Signal
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+# Разделители значений внутри ячейки и символы, отбрасываемые по краям слов
+_SEP_TRANS = str.maketrans({'\r': ' ', '\n': ' ', ',': ' ', ';': ' ', '\t': ' '})
+_STRIP_CHARS = '.,;:!?()[]{}"\''
+
+# Минимальный интервал между сообщениями о ходе поиска, секунды
+_MESSAGE_INTERVAL = 0.25
+# Минимальный интервал между обновлениями прогресс-бара (~30 раз в секунду), секунды
+_PROGRESS_INTERVAL = 0.033
+# Как часто проверять остановку поиска при ожидании результатов пула, секунды
+_STOP_CHECK_INTERVAL = 0.1
+# ProcessPoolExecutor в Windows не допускает больше 61 процесса
+_MAX_WINDOWS_WORKERS = 61
+# Ограничения кэша прочитанных листов: число файлов и общее число ячеек
+_SHEET_CACHE_SIZE = 128
+_SHEET_CACHE_MAX_CELLS = 5_000_000
+
+def read_excel_safely(file_path):
+    """
+    Безопасное открытие Excel файла только для чтения с валидацией
+    """
+    filename = os.path.basename(file_path)
+    try:
+        if filename.startswith('~$'):
+            raise ValueError(f"Файл {filename} является временным файлом Excel")
+        
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Файл {filename} не существует")
+        
+        file_size = os.path.getsize(file_path)
+        max_size = 500 * 1024 * 1024
+        if file_size > max_size:
+            raise ValueError(f"Файл {filename} слишком большой: {file_size // (1024*1024)}MB")
+        
+        if CalamineWorkbook is not None:
+            # calamine сообщает об отказе в доступе обычным OSError без errno,
+            # поэтому файл сначала открывается средствами Python: занятый файл
+            # или файл без прав доступа дают PermissionError, как и с openpyxl
+            with open(file_path, 'rb'):
+                pass
+            return CalamineWorkbook.from_path(file_path)
+        
+        return openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+        
+    except PermissionError:
+        raise PermissionError(f"Файл {filename} занят другим процессом или недостаточно прав")
+    except Exception as e:
+        raise Exception(f"Ошибка чтения файла {filename}: {str(e)}")
+
+
+def get_sheet_names(wb):
+    """
+    Список листов книги, открытой read_excel_safely
+    """
+    if CalamineWorkbook is not None and isinstance(wb, CalamineWorkbook):
+        return wb.sheet_names
+    return wb.sheetnames
+
+
+def project_row_values(rows, positions, width, empty_value):
+    """
+    Выбор из строк значений на позициях positions (0-индексные).
+    Позиции за пределами ширины строк width заполняются empty_value.
+    """
+    present = [position for position in positions if position < width]
+    padding = (empty_value,) * (len(positions) - len(present))
+    if not present:
+        return [padding for _ in rows]
+    if len(present) == 1:
+        position = present[0]
+        return [(row[position],) + padding for row in rows]
+    getter = itemgetter(*present)
+    return [getter(row) + padding for row in rows]
+
+
+def read_sheet_rows(wb, sheet_name, columns):
+    """
+    Чтение значений листа только в нужных столбцах.
+
+    Параметры:
+        wb: книга, открытая read_excel_safely.
+        sheet_name (str): название листа.
+        columns (tuple): номера нужных столбцов по возрастанию (1-индексные).
+
+    Возвращает:
+        tuple: (строки со значениями столбцов columns в том же порядке,
+            номер последнего заполненного столбца листа).
+        Пустые ячейки - None или "".
+    """
+    if CalamineWorkbook is not None and isinstance(wb, CalamineWorkbook):
+        sheet_rows = wb.get_sheet_by_name(sheet_name).to_python(skip_empty_area=False)
+        if not sheet_rows:
+            return [], 0
+        
+        width = len(sheet_rows[0])
+        return project_row_values(sheet_rows, [col - 1 for col in columns], width, ""), width
+    
+    # Строки читаются до последней ячейки без ограничения справа, чтобы ширина
+    # листа считалась так же, как у calamine, а не в пределах нужных столбцов
+    min_col = columns[0]
+    positions = [col - min_col for col in columns]
+    ws = wb[sheet_name]
+    ws.reset_dimensions()
+    rows = []
+    width = 0
+    for row in ws.iter_rows(min_col=min_col, values_only=True):
+        row_length = len(row)
+        while row_length and (row[row_length - 1] is None or row[row_length - 1] == ""):
+            row_length -= 1
+        if row_length:
+            width = max(width, min_col - 1 + row_length)
+        rows.append(tuple(row[position] if position < len(row) else None for position in positions))
+    
+    return rows, width
+
+
+def build_variant_map(search_values):
+    """
+    Подготовка искомых значений: для каждого значения строятся варианты написания
+    (регистр, без пробелов, числовая запись).
+
+    Возвращает:
+        tuple: (список искомых значений, словарь вариант -> индексы в этом списке).
+    """
+    search_originals = []
+    variant_map = {}
+    for value in search_values:
+        str_value = str(value).strip()
+        
+        if not str_value:
+            continue
+        
+        numeric_variants = []
+        try:
+            num_value = float(value)
+            numeric_variants = [str(int(num_value)), str(num_value)]
+        except (ValueError, TypeError, OverflowError):
+            pass
+        
+        search_variants = frozenset([
+            str_value,
+            str_value.lower(),
+            str_value.upper(),
+            str_value.replace(' ', ''),
+            *numeric_variants
+        ])
+        
+        for search_variant in search_variants:
+            variant_map.setdefault(search_variant, []).append(len(search_originals))
+        search_originals.append(str_value)
+    
+    return search_originals, variant_map
+
+
+def output_value(value):
+    """
+    Значение ячейки для файла результатов: пустые ячейки - "", целые числа без дробной части
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def find_matches(cells, variant_map):
+    """
+    Поиск совпадений в значениях столбца.
+    Ячейка один раз разбивается на слова по разделителям, каждое слово
+    проверяется одним обращением к словарю вариантов. Числа не содержат
+    разделителей и проверяются целиком, без разбиения.
+
+    Возвращает словарь {номер строки: множество индексов search_originals}.
+    """
+    matches = {}
+    sep_trans = _SEP_TRANS
+    strip_chars = _STRIP_CHARS
+    get_variant = variant_map.get
+    for row_index, cell_value in enumerate(cells):
+        if cell_value is None or cell_value == "":
+            continue
+        cell_type = type(cell_value)
+        if cell_type is float or cell_type is int:
+            if cell_type is float and cell_value.is_integer():
+                cell_value = int(cell_value)
+            data_indices = get_variant(str(cell_value))
+            if data_indices is not None:
+                matches.setdefault(row_index, set()).update(data_indices)
+            continue
+        
+        for part in str(cell_value).translate(sep_trans).split():
+            data_indices = get_variant(part.strip(strip_chars))
+            if data_indices is not None:
+                matches.setdefault(row_index, set()).update(data_indices)
+    return matches
+
+
+def select_sheets(sheet_names, sheets_mode):
+    """
+    Выбор листов для обработки по режиму ('first', 'all' или список названий).
+    """
+    if sheets_mode == "first":
+        return [sheet_names[0]] if sheet_names else []
+    elif sheets_mode == "all":
+        return sheet_names
+    elif isinstance(sheets_mode, list):
+        sheet_names_set = set(sheet_names)
+        return [sheet for sheet in sheets_mode if sheet in sheet_names_set]
+    return []
+
+
+def process_file_batch(file_tasks, **search_options):
+    """
+    Обработка группы файлов одной задачей пула процессов,
+    чтобы не передавать между процессами каждый файл по отдельности.
+
+    Параметры:
+        file_tasks (list): пары (путь к файлу, cache_cell_limit).
+    """
+    return [
+        process_one_file(file_path, cache_cell_limit=cache_cell_limit, **search_options)
+        for file_path, cache_cell_limit in file_tasks
+    ]
+
+
+def process_one_file(file_path, directory, search_originals, variant_map, column_index,
+                     selected_columns, needed_columns, sheets_mode, sheet_data=None, cache_cell_limit=0):
+    """
+    Поиск значений в одном Excel файле.
+    Функция уровня модуля, чтобы её можно было выполнять в отдельном процессе.
+
+    Параметры:
+        file_path (str): путь к Excel файлу.
+        directory (str): корневая директория поиска (для отображаемого имени файла).
+        search_originals (list): искомые значения в исходном виде.
+        variant_map (dict): вариант написания -> индексы в search_originals.
+        column_index (int): номер столбца для поиска (1-индексный).
+        selected_columns (list): номера столбцов для копирования результатов.
+        needed_columns (tuple): номера всех читаемых столбцов по возрастанию.
+        sheets_mode (str or list): режим выбора листов ('first', 'all' или список названий).
+        sheet_data (tuple): уже прочитанные листы из кэша
+            (листы книги, {лист: (строки, номер последнего заполненного столбца)});
+            если задан, файл не открывается.
+        cache_cell_limit (int): вернуть прочитанные строки листов для кэширования,
+            если в них не больше указанного числа ячеек (0 - не возвращать).
+
+    Возвращает:
+        tuple: (найденные строки, строки ошибок, имя занятого файла или None,
+            прочитанные листы для кэша или None).
+    """
+    results = []
+    errors = []
+    locked_file = None
+    search_position = needed_columns.index(column_index)
+    selected_positions = [needed_columns.index(col_idx) for col_idx in selected_columns]
+    
+    file_name = os.path.basename(file_path)
+    rel_path = os.path.relpath(file_path, directory)
+    if rel_path == file_name:
+        display_name = file_name
+    else:
+        display_name = rel_path
+    
+    wb = None
+    loaded_data = None
+    
+    try:
+        if sheet_data is None:
+            wb = read_excel_safely(file_path)
+            sheet_names = get_sheet_names(wb)
+            sheet_rows = {}
+        else:
+            sheet_names, sheet_rows = sheet_data
+
+        sheets_to_process = select_sheets(sheet_names, sheets_mode)
+        
+        if not sheets_to_process:
+            error_msg = f"В файле {display_name} нет указанных листов"
+            
+            error_row = [error_msg]
+            for _ in selected_columns:
+                error_row.append("")
+            error_row.append(display_name)
+            errors.append(error_row)
+            return results, errors, locked_file, None
+
+        for sheet_name in sheets_to_process:
+            source_label = f"{display_name} (лист: {sheet_name})"
+            try:
+                loaded_sheet = sheet_rows.get(sheet_name)
+                if loaded_sheet is None:
+                    loaded_sheet = read_sheet_rows(wb, sheet_name, needed_columns)
+                    sheet_rows[sheet_name] = loaded_sheet
+                rows, sheet_width = loaded_sheet
+                
+                if not rows:
+                    continue
+                
+                if sheet_width < column_index:
+                    error_msg = f"В файле {display_name} (лист '{sheet_name}') нет столбца {column_index}"
+                    
+                    error_row = [error_msg]
+                    for _ in selected_columns:
+                        error_row.append("")
+                    error_row.append(source_label)
+                    errors.append(error_row)
+                    continue
+                
+                matches = find_matches((row[search_position] for row in rows), variant_map)
+                
+                for row_index, data_indices in matches.items():
+                    row = rows[row_index]
+                    copied_values = [output_value(row[position]) for position in selected_positions]
+                    
+                    for data_index in sorted(data_indices):
+                        results.append([search_originals[data_index], *copied_values, source_label])
+                        
+            except Exception as e:
+                error_msg = f"Ошибка при обработке листа '{sheet_name}' в файле {display_name}: {str(e)}"
+                
+                error_row = [error_msg]
+                for _ in selected_columns:
+                    error_row.append("")
+                error_row.append(source_label)
+                errors.append(error_row)
+                continue
+        
+        if cache_cell_limit and sheet_data is None:
+            cell_count = sum(len(rows) for rows, _ in sheet_rows.values()) * len(needed_columns)
+            if cell_count <= cache_cell_limit:
+                loaded_data = (sheet_names, sheet_rows)
+                
+    except PermissionError as e:
+        locked_file = display_name
+        error_msg = f"Файл {display_name} занят другим процессом"
+        
+        error_row = [error_msg]
+        for _ in selected_columns:
+            error_row.append("")
+        error_row.append(display_name)
+        errors.append(error_row)
+        
+    except Exception as e:
+        error_msg = f"Ошибка при обработке файла {display_name}: {str(e)}"
+        
+        error_row = [error_msg]
+        for _ in selected_columns:
+            error_row.append("")
+        error_row.append(display_name)
+        errors.append(error_row)
+    finally:
+        try:
+            if wb is not None:
+                wb.close()
+        except:
+            pass
+    
+    return results, errors, locked_file, loaded_data
+
+
+class SheetCache:
+    """
+    LRU-кэш прочитанных листов для повторных поисков по тем же файлам.
+    Ключ - путь к файлу и набор читаемых столбцов; запись действительна,
+    пока у файла не изменились время изменения и размер.
+    Строки файла запрашиваются у процесса обработки, только если помещаются
+    в свободное место кэша, чтобы не передавать данные, которые сразу вытеснятся.
+    """
+    def __init__(self, maxsize=_SHEET_CACHE_SIZE, max_cells=_SHEET_CACHE_MAX_CELLS):
+        """
+        Параметры:
+            maxsize (int): максимальное число файлов в кэше.
+            max_cells (int): максимальное общее число ячеек в кэше.
+        """
+        self.maxsize = maxsize
+        self.max_cells = max_cells
+        self._entries = OrderedDict()
+        self._cell_count = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def file_stamp(file_path):
+        """
+        Отметка версии файла: (время изменения, размер) или None, если файл недоступен.
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def get(self, file_path, columns, stamp, sheets_mode):
+        """
+        Получение прочитанных листов файла.
+
+        Возвращает:
+            tuple: (листы книги, {лист: (строки, ширина листа)}) или None, если файла нет в кэше,
+            он изменился или в кэше нет нужных листов.
+        """
+        if stamp is None:
+            return None
+        
+        key = (file_path, columns)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            
+            entry_stamp, sheet_data, cell_count = entry
+            if entry_stamp != stamp:
+                del self._entries[key]
+                self._cell_count -= cell_count
+                return None
+            
+            sheet_names, sheet_rows = sheet_data
+            if not all(sheet in sheet_rows for sheet in select_sheets(sheet_names, sheets_mode)):
+                return None
+            
+            self._entries.move_to_end(key)
+            return sheet_data
+    
+    def free_cells(self):
+        """
+        Сколько ячеек ещё можно принять в кэш без вытеснения записей.
+        """
+        with self._lock:
+            return max(0, self.max_cells - self._cell_count)
+    
+    def put(self, file_path, columns, stamp, sheet_data):
+        """
+        Сохранение прочитанных листов файла с вытеснением давно не использованных.
+        """
+        if stamp is None:
+            return
+        
+        cell_count = sum(len(rows) for rows, _ in sheet_data[1].values()) * len(columns)
+        if cell_count > self.max_cells:
+            return
+        
+        key = (file_path, columns)
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self._cell_count -= old_entry[2]
+            
+            self._entries[key] = (stamp, sheet_data, cell_count)
+            self._cell_count += cell_count
+            
+            while len(self._entries) > self.maxsize or self._cell_count > self.max_cells:
+                _, (_, _, evicted_count) = self._entries.popitem(last=False)
+                self._cell_count -= evicted_count
+
 
 class SearchWorker(QThread):
     """
@@ -26,7 +489,8 @@ class SearchWorker(QThread):
     finished = Signal(bool, str)
     
     def __init__(self, search_values, directory, column_index, selected_columns, 
-                 output_file, sheets_mode, recursive_search):
+                 output_file, sheets_mode, recursive_search, executor=None, sheet_cache=None,
+                 excel_files=None, scanned_dirs=None):
         """
         Инициализация рабочего потока.
 
@@ -38,6 +502,12 @@ class SearchWorker(QThread):
             output_file (str): путь к файлу для сохранения результатов.
             sheets_mode (str or list): режим выбора листов ('first', 'all' или список названий).
             recursive_search (bool): True для рекурсивного поиска в подпапках
+            executor (ProcessPoolExecutor): общий пул процессов; если не задан,
+                пул создаётся на время поиска.
+            sheet_cache (SheetCache): кэш прочитанных листов между поисками.
+            excel_files (list): список Excel файлов из предыдущего поиска по этой директории.
+            scanned_dirs (list): пары (папка, st_mtime_ns), при которых был получен excel_files;
+                если какая-то папка изменилась, директория сканируется заново.
         """
         super().__init__()
         self.search_values = search_values
@@ -47,103 +517,77 @@ class SearchWorker(QThread):
         self.output_file = output_file
         self.sheets_mode = sheets_mode
         self.recursive_search = recursive_search
+        self.executor = executor
+        self.executor_broken = False
+        self.sheet_cache = sheet_cache
+        self.excel_files = excel_files
+        self.scanned_dirs = scanned_dirs if excel_files is not None else []
         self.is_running = True
+        self._futures = []
+        self._search_originals, self._variant_map = build_variant_map(search_values)
+        self._needed_cols = tuple(sorted(set(selected_columns) | {column_index}))
+        self._last_progress = -1
+        self._last_progress_time = 0.0
+        self._pending_progress = None
+        self._pending_message = None
+        self._last_message_time = 0.0
         
-    def read_excel_safely(self, file_path):
+    def emit_progress(self, percent):
         """
-        Безопасное чтение Excel файла через временную копию с валидацией
+        Отправка прогресса только при изменении процента
+        и не чаще _PROGRESS_INTERVAL секунд (100% отправляется всегда).
+        Пропущенный процент отправляется в flush_progress.
         """
-        temp_path = None
-        try:
-            filename = os.path.basename(file_path)
-            
-            if filename.startswith('~$'):
-                raise ValueError(f"Файл {filename} является временным файлом Excel")
-            
-            if not os.path.exists(file_path):
-                raise FileNotFoundError(f"Файл {filename} не существует")
-            
-            file_size = os.path.getsize(file_path)
-            max_size = 500 * 1024 * 1024
-            if file_size > max_size:
-                raise ValueError(f"Файл {filename} слишком большой: {file_size // (1024*1024)}MB")
-            
-            temp_dir = tempfile.gettempdir()
-            temp_filename = f"excel_search_temp_{os.urandom(8).hex()}.xlsx"
-            temp_path = os.path.join(temp_dir, temp_filename)
-            
-            shutil.copy2(file_path, temp_path)
-            
-            if not os.path.exists(temp_path):
-                raise IOError(f"Не удалось создать временную копию файла {filename}")
-
-            xls = pd.ExcelFile(temp_path, engine='openpyxl')
-            
-            return xls, temp_path
-            
-        except PermissionError:
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.unlink(temp_path)
-                except:
-                    pass
-            raise PermissionError(f"Файл {filename} занят другим процессом или недостаточно прав")
-        except Exception as e:
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.unlink(temp_path)
-                except:
-                    pass
-            raise Exception(f"Ошибка чтения файла {filename}: {str(e)}")
-
-    def safe_delete_temp_file(self, temp_path):
+        if percent == self._last_progress:
+            self._pending_progress = None
+            return
+        
+        now = time.monotonic()
+        if percent == 100 or now - self._last_progress_time >= _PROGRESS_INTERVAL:
+            self._pending_progress = None
+            self._last_progress = percent
+            self._last_progress_time = now
+            self.progress.emit(percent)
+        else:
+            self._pending_progress = percent
+    
+    def flush_progress(self):
         """
-        Безопасное удаление временного файла.
+        Отправка последнего пропущенного процента.
         """
-        if temp_path and os.path.exists(temp_path):
-            try:
-                temp_dir = tempfile.gettempdir()
-                if os.path.commonprefix([os.path.abspath(temp_path), os.path.abspath(temp_dir)]) == os.path.abspath(temp_dir):
-                    os.unlink(temp_path)
-            except Exception as e:
-                self.message.emit(f"Не удалось удалить временный файл: {e}")
-
-    def is_safe_to_delete(self, file_path):
+        if self._pending_progress is not None:
+            self._last_progress = self._pending_progress
+            self._last_progress_time = time.monotonic()
+            self.progress.emit(self._pending_progress)
+            self._pending_progress = None
+    
+    def emit_message(self, text):
         """
-        Проверяет, что файл можно безопасно удалить
+        Отправка сообщения не чаще _MESSAGE_INTERVAL секунд.
+        Промежуточные сообщения заменяются последним, он отправляется в flush_message.
         """
-        try:
-            if not file_path:
-                return False
-
-            if not os.path.exists(file_path):
-                return False
-                
-            temp_dir = tempfile.gettempdir()
-            file_path_abs = os.path.abspath(file_path)
-            temp_dir_abs = os.path.abspath(temp_dir)
-            
-            if not os.path.commonpath([file_path_abs, temp_dir_abs]) == temp_dir_abs:
-                return False
-
-            filename = os.path.basename(file_path)
-            if not filename.startswith('excel_search_temp_'):
-                return False
-
-            if not os.path.isfile(file_path):
-                return False
-
-            if not filename.lower().endswith(('.xlsx', '.xls', '.xlsm', '.xlsb')):
-                return False
-                
-            return True
-            
-        except Exception:
-            return False
-
+        now = time.monotonic()
+        if now - self._last_message_time >= _MESSAGE_INTERVAL:
+            self._pending_message = None
+            self._last_message_time = now
+            self.message.emit(text)
+        else:
+            self._pending_message = text
+    
+    def flush_message(self):
+        """
+        Отправка последнего отложенного сообщения.
+        """
+        if self._pending_message is not None:
+            self.message.emit(self._pending_message)
+            self._pending_message = None
+            self._last_message_time = time.monotonic()
+        
     def get_excel_files_safely(self, directory, recursive=True):
         """
-        Получение списка Excel файлов с пропуском временных файлов и валидацией
+        Получение списка Excel файлов с пропуском временных файлов и валидацией.
+        Файлы возвращаются от больших к меньшим, чтобы крупные книги
+        начинали обрабатываться первыми и не задерживали окончание поиска.
         
         Параметры:
             directory (str): путь к корневой директории
@@ -160,49 +604,82 @@ class SearchWorker(QThread):
             return []
         
         try:
-            if recursive:
-                for root, dirs, files in os.walk(directory):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        
-                        if file.startswith('~$'):
-                            self.message.emit(f"Пропущен временный файл Excel: {file}")
+            pending_dirs = [directory]
+            while pending_dirs:
+                current_dir = pending_dirs.pop()
+                try:
+                    # Время изменения берётся до чтения папки: изменения во время
+                    # сканирования сделают сохранённый список устаревшим
+                    dir_mtime = os.stat(current_dir).st_mtime_ns
+                    entries = list(os.scandir(current_dir))
+                except OSError:
+                    if current_dir == directory:
+                        raise
+                    continue
+                self.scanned_dirs.append((current_dir, dir_mtime))
+                
+                for entry in entries:
+                    if recursive:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending_dirs.append(entry.path)
+                                continue
+                        except OSError:
                             continue
-                        
-                        file_lower = file.lower()
-                        if file_lower.endswith(('.xlsx', '.xls', '.xlsm', '.xlsb')):
-                            excel_files.append(file_path)
-            else:
-                for file in os.listdir(directory):
-                    file_path = os.path.join(directory, file)
                     
-                    if file.startswith('~$'):
-                        self.message.emit(f"Пропущен временный файл Excel: {file}")
+                    if entry.name.startswith('~$'):
+                        self.emit_message(f"Пропущен временный файл Excel: {entry.name}")
                         continue
                     
-                    if not os.path.isfile(file_path):
+                    if not entry.name.lower().endswith(('.xlsx', '.xls', '.xlsm', '.xlsb')):
                         continue
                     
-                    file_lower = file.lower()
-                    if file_lower.endswith(('.xlsx', '.xls', '.xlsm', '.xlsb')):
-                        excel_files.append(file_path)
+                    try:
+                        if not recursive and not entry.is_file():
+                            continue
+                        file_size = entry.stat().st_size
+                    except OSError:
+                        file_size = 0
+                    excel_files.append((file_size, entry.path))
         
         except PermissionError:
             self.message.emit(f"Нет доступа к директории: {directory}")
         except Exception as e:
             self.message.emit(f"Ошибка при чтении директории: {str(e)}")
         
-        return excel_files
+        excel_files.sort(key=lambda item: -item[0])
+        return [file_path for _, file_path in excel_files]
+    
+    def listing_is_current(self):
+        """
+        Проверка, что папки из сохранённого списка файлов не изменились
+        (добавление, удаление и переименование файлов меняют время изменения папки).
+        """
+        for dir_path, dir_mtime in self.scanned_dirs:
+            try:
+                if os.stat(dir_path).st_mtime_ns != dir_mtime:
+                    return False
+            except OSError:
+                return False
+        return True
     
     def run(self):
         """
         Основной метод выполнения поиска. Вызывается автоматически при старте потока.
         """
-        temp_files_to_cleanup = [] 
-        
         try:
+            if self.excel_files is not None and not self.listing_is_current():
+                self.excel_files = None
+                self.scanned_dirs = []
+            
+            if self.excel_files is None:
+                self.message.emit("Поиск Excel файлов...")
+                self.excel_files = self.get_excel_files_safely(self.directory, self.recursive_search)
+                self.flush_message()
+            excel_files = self.excel_files
+            
             try:
-                self.validate_output_path(self.output_file, self.directory)
+                self.validate_output_path(self.output_file, self.directory, excel_files)
             except ValueError as e:
                 self.finished.emit(False, f"Ошибка пути: {str(e)}")
                 return
@@ -210,10 +687,6 @@ class SearchWorker(QThread):
                 self.finished.emit(False, f"Ошибка проверки пути: {str(e)}")
                 return
             
-            self.message.emit("Поиск Excel файлов...")
-            
-            excel_files = self.get_excel_files_safely(self.directory, self.recursive_search)
-            
             if not excel_files:
                 self.finished.emit(False, "В указанной директории не найдено Excel файлов")
                 return
@@ -221,202 +694,185 @@ class SearchWorker(QThread):
             search_mode = "с подпапками" if self.recursive_search else "без подпапок"
             self.message.emit(f"Найдено {len(excel_files)} Excel файлов (поиск {search_mode})")
             
-            search_data = []  
-            for value in self.search_values:
-                str_value = str(value).strip()
-                
-                if not str_value:
-                    continue
-                
-                search_variants = [
-                    str_value,
-                    str_value.lower(),
-                    str_value.upper(),
-                    str_value.replace(' ', '')
-                ]
-                
-                try:
-                    num_value = float(value)
-                    search_variants.append(str(int(num_value)))
-                    search_variants.append(str(num_value))
-                    if num_value == int(num_value):
-                        search_variants.append(str(int(num_value)))
-                except (ValueError, TypeError):
-                    pass
-                
-                search_data.append((str_value, search_variants))
-            
-            if not search_data:
+            if not self._search_originals:
                 self.finished.emit(False, "Нет валидных значений для поиска")
                 return
             
-            all_results = []
             error_results = []
             locked_files = []  
             total_files = len(excel_files)
-            found_count = 0
+            success_count = 0
             
-            for i, file_path in enumerate(excel_files):
-                if not self.is_running:
-                    self.message.emit("Поиск прерван пользователем")
-                    break
-                    
-                rel_path = os.path.relpath(file_path, self.directory)
-                if rel_path == os.path.basename(file_path):
-                    display_name = os.path.basename(file_path)
-                else:
-                    display_name = rel_path
-                
-                self.message.emit(f"Обработка файла: {display_name}")
-                self.progress.emit(int((i / total_files) * 100))
+            headers = ["Искомые значения"]
+            headers.extend([f"Столбец {i}" for i in self.selected_columns])
+            headers.append("Файл источника")
+            
+            wb_out = openpyxl.Workbook(write_only=True)
+            ws_out = wb_out.create_sheet('Результаты')
+            for col_number in range(1, len(headers) + 1):
+                ws_out.column_dimensions[openpyxl.utils.get_column_letter(col_number)].width = 30
+            
+            header_cells = []
+            for header in headers:
+                cell = WriteOnlyCell(ws_out, value=header)
+                cell.font = Font(bold=True)
+                header_cells.append(cell)
+            ws_out.append(header_cells)
+            
+            search_options = dict(
+                directory=self.directory,
+                search_originals=self._search_originals,
+                variant_map=self._variant_map,
+                column_index=self.column_index,
+                selected_columns=self.selected_columns,
+                needed_columns=self._needed_cols,
+                sheets_mode=self.sheets_mode
+            )
+            
+            # Файлы, листы которых уже прочитаны в предыдущих поисках,
+            # обрабатываются из кэша без повторного чтения с диска
+            cached_files = {}
+            pending_tasks = []
+            file_stamps = {}
+            free_cells = self.sheet_cache.free_cells() if self.sheet_cache is not None else 0
+            for file_path in excel_files:
+                stamp = SheetCache.file_stamp(file_path)
+                file_stamps[file_path] = stamp
                 
-                xls = None
-                temp_file_path = None
+                sheet_data = None
+                if self.sheet_cache is not None:
+                    sheet_data = self.sheet_cache.get(file_path, self._needed_cols, stamp, self.sheets_mode)
+                if sheet_data is not None:
+                    cached_files[file_path] = sheet_data
+                else:
+                    pending_tasks.append((file_path, free_cells))
+            
+            # Вес файла для прогресса - его размер: крупные файлы обрабатываются первыми,
+            # и прогресс по числу файлов долго стоял бы на месте
+            file_weights = {
+                file_path: max(1, file_stamps[file_path][1] if file_stamps[file_path] else 0)
+                for file_path in excel_files
+            }
+            total_weight = sum(file_weights.values())
+            
+            own_executor = None
+            pending_positions = {}
+            batches = []
+            try:
+                if len(pending_tasks) > 1:
+                    executor = self.executor
+                    if executor is None:
+                        max_workers = min(len(pending_tasks), os.cpu_count() or 1)
+                        if sys.platform == "win32":
+                            max_workers = min(max_workers, _MAX_WINDOWS_WORKERS)
+                        executor = own_executor = ProcessPoolExecutor(max_workers=max_workers)
+                    
+                    # Файлы упорядочены по убыванию размера. Пакеты собираются из соседних
+                    # файлов примерно одинакового общего размера: крупные файлы идут по одному,
+                    # мелкие группами. Такие пакеты завершаются примерно в порядке отправки,
+                    # то есть в том же порядке, в котором записываются результаты
+                    file_sizes = [file_weights[file_path] for file_path, _ in pending_tasks]
+                    batch_parts = 4 * (os.cpu_count() or 1)
+                    max_batch_files = max(1, len(pending_tasks) // batch_parts)
+                    target_batch_size = sum(file_sizes) / batch_parts
+                    batch = []
+                    batch_bytes = 0
+                    for task, file_size in zip(pending_tasks, file_sizes):
+                        batch.append(task)
+                        batch_bytes += file_size
+                        if batch_bytes >= target_batch_size or len(batch) >= max_batch_files:
+                            batches.append(batch)
+                            batch = []
+                            batch_bytes = 0
+                    if batch:
+                        batches.append(batch)
+                    
+                    for batch in batches:
+                        future = executor.submit(process_file_batch, batch, **search_options)
+                        self._futures.append(future)
+                        for position, (file_path, _) in enumerate(batch):
+                            pending_positions[file_path] = (future, position)
                 
-                try:
-                    xls, temp_file_path = self.read_excel_safely(file_path)
-                    if temp_file_path:
-                        temp_files_to_cleanup.append(temp_file_path)
+                # Результаты записываются в порядке списка файлов, независимо от того,
+                # взяты листы из кэша или прочитаны заново. Прогресс считается по уже
+                # обработанным файлам, в том числе ещё не записанным из готовых пакетов
+                batch_weights = [sum(file_weights[file_path] for file_path, _ in batch) for batch in batches]
+                completed_files = 0
+                completed_weight = 0
+                written_weight = 0
+                written_pool_files = 0
+                written_pool_weight = 0
+                for i, file_path in enumerate(excel_files):
+                    if file_path in cached_files:
+                        file_result = process_one_file(file_path, sheet_data=cached_files[file_path], **search_options)
+                    elif file_path in pending_positions:
+                        future, position = pending_positions[file_path]
+                        if not future.done():
+                            # Перед ожиданием пакета показываем актуальное состояние
+                            self.flush_progress()
+                            self.flush_message()
+                        while self.is_running and not future.done():
+                            wait([future], timeout=_STOP_CHECK_INTERVAL)
+                            done_batches = [
+                                index for index, batch_future in enumerate(self._futures) if batch_future.done()
+                            ]
+                            ready_files = i + sum(len(batches[index]) for index in done_batches) - written_pool_files
+                            ready_weight = written_weight + sum(batch_weights[index] for index in done_batches) - written_pool_weight
+                            if ready_files > completed_files:
+                                completed_files = ready_files
+                                completed_weight = max(completed_weight, ready_weight)
+                                self.emit_message(f"Обработано файлов: {completed_files} из {total_files}")
+                                self.emit_progress(int((completed_weight / total_weight) * 100))
+                        if not self.is_running:
+                            self.emit_message("Поиск прерван пользователем")
+                            break
+                        file_result = future.result()[position]
+                        written_pool_files += 1
+                        written_pool_weight += file_weights[file_path]
+                    else:
+                        file_result = process_one_file(file_path, cache_cell_limit=pending_tasks[0][1], **search_options)
                     
-                    sheet_names = xls.sheet_names
-
-                    sheets_to_process = []
-                    if self.sheets_mode == "first":
-                        sheets_to_process = [sheet_names[0]] if sheet_names else []
-                    elif self.sheets_mode == "all":
-                        sheets_to_process = sheet_names
-                    elif isinstance(self.sheets_mode, list):
-                        sheets_to_process = [sheet for sheet in self.sheets_mode if sheet in sheet_names]
+                    results, errors, locked_file, sheet_data = file_result
+                    if sheet_data is not None:
+                        self.sheet_cache.put(file_path, self._needed_cols, file_stamps[file_path], sheet_data)
                     
-                    if not sheets_to_process:
-                        error_msg = f"В файле {display_name} нет указанных листов"
-                        self.message.emit(error_msg)
-                        
-                        error_row = [error_msg]
-                        for _ in self.selected_columns:
-                            error_row.append("")
-                        error_row.append(display_name)
-                        error_results.append(error_row)
-                        continue
-
-                    for sheet_name in sheets_to_process:
-                        try:
-                            df = pd.read_excel(xls, sheet_name=sheet_name, header=None, engine='openpyxl')
-                            
-                            if df is None or df.empty:
-                                continue
-                            
-                            if self.column_index - 1 >= len(df.columns):
-                                error_msg = f"В файле {display_name} (лист '{sheet_name}') нет столбца {self.column_index}"
-                                self.message.emit(error_msg)
-                                
-                                error_row = [error_msg]
-                                for _ in self.selected_columns:
-                                    error_row.append("")
-                                error_row.append(f"{display_name} (лист: {sheet_name})")
-                                error_results.append(error_row)
-                                continue
-                            
-                            search_column = df.iloc[:, self.column_index - 1]
-                            
-                            for idx in range(len(df)):
-                                if not self.is_running:
-                                    break
-                                    
-                                cell_value = search_column.iloc[idx]
-                                if pd.isna(cell_value):
-                                    continue
-                                
-                                cell_str = str(cell_value)
-                                found_in_cell = []
-                                
-                                for search_original, search_variants in search_data:
-                                    for search_variant in search_variants:
-                                        if self.is_exact_match(cell_str, search_variant):
-                                            found_in_cell.append(search_original)
-                                            break  
-                                
-                                for found_value in found_in_cell:
-                                    result_row = []
-                                    result_row.append(found_value)
-                                    
-                                    for col_idx in self.selected_columns:
-                                        if col_idx - 1 < len(df.columns):
-                                            value = df.iloc[idx, col_idx - 1]
-                                            result_row.append(value if pd.notna(value) else "")
-                                        else:
-                                            result_row.append("")
-                                    
-                                    result_row.append(f"{display_name} (лист: {sheet_name})")
-                                    all_results.append(result_row)
-                                    found_count += 1
-                                    
-                        except Exception as e:
-                            error_msg = f"Ошибка при обработке листа '{sheet_name}' в файле {display_name}: {str(e)}"
-                            self.message.emit(error_msg)
-                            
-                            error_row = [error_msg]
-                            for _ in self.selected_columns:
-                                error_row.append("")
-                            error_row.append(f"{display_name} (лист: {sheet_name})")
-                            error_results.append(error_row)
-                            continue
-                            
-                except PermissionError as e:
-                    locked_files.append(display_name)
-                    error_msg = f"Файл {display_name} занят другим процессом"
-                    self.message.emit(error_msg)
+                    for result_row in results:
+                        ws_out.append(result_row)
+                    success_count += len(results)
+                    error_results.extend(errors)
+                    if locked_file:
+                        locked_files.append(locked_file)
                     
-                    error_row = [error_msg]
-                    for _ in self.selected_columns:
-                        error_row.append("")
-                    error_row.append(display_name)
-                    error_results.append(error_row)
+                    for error_row in errors:
+                        self.emit_message(error_row[0])
                     
-                except Exception as e:
-                    error_msg = f"Ошибка при обработке файла {display_name}: {str(e)}"
-                    self.message.emit(error_msg)
+                    written_weight += file_weights[file_path]
+                    completed_files = max(completed_files, i + 1)
+                    completed_weight = max(completed_weight, written_weight)
+                    self.emit_message(f"Обработано файлов: {completed_files} из {total_files}")
+                    self.emit_progress(int((completed_weight / total_weight) * 100))
                     
-                    error_row = [error_msg]
-                    for _ in self.selected_columns:
-                        error_row.append("")
-                    error_row.append(display_name)
-                    error_results.append(error_row)
-                finally:
-                    try:
-                        if xls is not None:
-                            xls.close()
-                    except:
-                        pass
+                    if not self.is_running:
+                        self.emit_message("Поиск прерван пользователем")
+                        break
+            finally:
+                self.flush_progress()
+                self.flush_message()
+                for future in self._futures:
+                    future.cancel()
+                if own_executor is not None:
+                    own_executor.shutdown(wait=False)
             
-            combined_results = all_results + error_results
-            
-            if combined_results:
-                headers = ["Искомые значения"]
-                headers.extend([f"Столбец {i}" for i in self.selected_columns])
-                headers.append("Файл источника")
-                
-                result_df = pd.DataFrame(combined_results, columns=headers)
-                
+            if success_count or error_results:
                 try:
                     output_dir = os.path.dirname(self.output_file)
                     if output_dir and not os.path.exists(output_dir):
                         os.makedirs(output_dir, exist_ok=True)
                     
-                    if os.path.abspath(self.output_file) in [os.path.abspath(f) for f in excel_files]:
-                        raise ValueError("Файл результатов не может совпадать с исходными файлами поиска")
-                    
-                    with pd.ExcelWriter(self.output_file, engine='openpyxl') as writer:
-                        result_df.to_excel(writer, sheet_name='Результаты', index=False)
-                        
-                        workbook = writer.book
-                        worksheet = writer.sheets['Результаты']
-                        
-                        for col in worksheet.columns:
-                            column_letter = openpyxl.utils.get_column_letter(col[0].column)
-                            worksheet.column_dimensions[column_letter].width = 30
+                    for error_row in error_results:
+                        ws_out.append(error_row)
+                    wb_out.save(self.output_file)
                     
-                    success_count = len(all_results)
                     error_count = len(error_results)
                     
                     if locked_files:
@@ -443,47 +899,23 @@ class SearchWorker(QThread):
                     final_message = "Совпадений не найдено"
                 self.finished.emit(True, final_message)
                 
+        except BrokenProcessPool:
+            self.executor_broken = True
+            self.finished.emit(False, "Критическая ошибка: процесс обработки файлов аварийно завершился")
         except Exception as e:
             error_trace = traceback.format_exc()
             print(f"Критическая ошибка: {error_trace}")
             self.finished.emit(False, f"Критическая ошибка: {str(e)}")
-        finally:
-            for temp_file in temp_files_to_cleanup:
-                self.safe_delete_temp_file(temp_file)
-            
-            try:
-                if 'xls' in locals() and xls is not None:
-                    xls.close()
-            except:
-                pass
-
-    def is_exact_match(self, cell_str, search_variant):
-        """
-        Проверяет точное совпадение search_variant в cell_str с учетом разделителей
-        """
-        if not cell_str or not search_variant:
-            return False
 
-        normalized_cell = cell_str
-        normalized_cell = normalized_cell.replace('\r\n', ' ').replace('\r', ' ').replace('\n', ' ')
-        normalized_cell = normalized_cell.replace(',', ' ').replace(';', ' ')
-        normalized_cell = normalized_cell.replace('\t', ' ')
-        parts = normalized_cell.split()
-        for part in parts:
-            part_clean = part.strip('.,;:!?()[]{}"\'')
-            if not part_clean:
-                continue
-            if part_clean == search_variant:
-                return True
-            if part_clean.replace(' ', '') == search_variant:
-                return True
-        
-        return False
-    
-    def validate_output_path(self, output_file, search_directory):
+    def validate_output_path(self, output_file, search_directory, excel_files):
         """
         Проверяет что выходной файл не находится в директории поиска
         и не совпадает с исходными файлами.
+
+        Параметры:
+            output_file (str): путь к файлу результатов.
+            search_directory (str): директория поиска.
+            excel_files (list): уже найденные исходные Excel файлы.
         """
         output_abs = os.path.abspath(output_file)
         search_abs = os.path.abspath(search_directory)
@@ -491,19 +923,19 @@ class SearchWorker(QThread):
         if output_abs.startswith(search_abs + os.sep):
             raise ValueError("Файл результатов нельзя сохранять в той же папке или подпапках, где находятся исходные файлы")
         
-        if os.path.exists(output_abs):
-            excel_files = self.get_excel_files_safely(search_directory, recursive=True)
-            for file_path in excel_files:
-                if os.path.abspath(file_path) == output_abs:
-                    raise ValueError(f"Файл результатов совпадает с исходным файлом: {os.path.basename(file_path)}")
+        if output_abs in {os.path.abspath(file_path) for file_path in excel_files}:
+            raise ValueError(f"Файл результатов совпадает с исходным файлом: {os.path.basename(output_abs)}")
         
         return True
     
     def stop(self):
         """
-        Остановка поиска.
+        Остановка поиска: ещё не начатые пакеты файлов отменяются сразу,
+        ожидание текущего пакета прерывается.
         """
         self.is_running = False
+        for future in list(self._futures):
+            future.cancel()
 
 
 class ExcelSearchApp(QMainWindow):
@@ -518,6 +950,13 @@ class ExcelSearchApp(QMainWindow):
         """
         super().__init__()
         self.search_worker = None
+        self.executor = None
+        self.sheet_cache = SheetCache()
+        # Тихий режим: итог поиска только в строке статуса, без модальных окон
+        self.quiet_mode = os.environ.get("EXCEL_SEARCH_QUIET") == "1"
+        # Списки Excel файлов по (директория, рекурсивный поиск) вместе со временем
+        # изменения просканированных папок; актуальность проверяется перед поиском
+        self._dir_cache = {}
         self.init_ui()
         
     def init_ui(self):
@@ -779,28 +1218,62 @@ class ExcelSearchApp(QMainWindow):
         
         self.search_worker = SearchWorker(
             search_values, directory, column_index, selected_columns, 
-            output_file, sheets_mode, recursive_search
+            output_file, sheets_mode, recursive_search, self.get_executor(), self.sheet_cache,
+            *self._dir_cache.get((directory, recursive_search), (None, None))
         )
         self.search_worker.progress.connect(self.progress_bar.setValue)
         self.search_worker.message.connect(self.status_label.setText)
         self.search_worker.finished.connect(self.search_finished)
         self.search_worker.start()
     
+    def get_executor(self):
+        """
+        Общий пул процессов для обработки файлов.
+        Создаётся при первом поиске и переиспользуется, чтобы не запускать процессы заново.
+        """
+        if self.executor is None:
+            # Число процессов по умолчанию - по числу процессоров, в Windows не больше 61
+            self.executor = ProcessPoolExecutor()
+        return self.executor
+    
     def search_finished(self, success, message):
         """
         Обработчик завершения поиска.
         """
+        if self.search_worker and self.search_worker.executor_broken:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        
+        if self.search_worker and self.search_worker.scanned_dirs and self.search_worker.excel_files:
+            cache_key = (self.search_worker.directory, self.search_worker.recursive_search)
+            self._dir_cache[cache_key] = (self.search_worker.excel_files, self.search_worker.scanned_dirs)
+        
         self.progress_bar.setVisible(False)
         self.search_button.setEnabled(True)
         self.status_label.setText(message)
         
+        if self.quiet_mode:
+            return
+        
         if success:
             QMessageBox.information(self, "Успех", message)
         else:
             QMessageBox.critical(self, "Ошибка", message)
+    
+    def closeEvent(self, event):
+        """
+        Остановка поиска и пула процессов при закрытии окна.
+        """
+        if self.search_worker and self.search_worker.isRunning():
+            self.search_worker.stop()
+            self.search_worker.wait()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     
     app.setStyle('Fusion')